@@ -1,7 +1,27 @@
-from typing import Generator, List, Optional, Union
-from bs4 import BeautifulSoup, Tag, NavigableString
+import re
+from functools import lru_cache
+from typing import Generator, Iterator, List, Optional, Tuple
+from lxml import etree
 
 MAX_LEN = 4096
+# Bytes of source handed to libxml2 per feed() call.
+_FEED_SIZE = 64 * 1024
+
+# Tags whose whole subtree must stay in a single fragment.
+_UNSPLITTABLE_TAGS = frozenset({'a', 'code', 'mention'})
+# Tags that are reopened around every fragment cut from their content.
+_BLOCK_TAGS = frozenset({'p', 'b', 'strong', 'i', 'ul', 'ol', 'div', 'span'})
+# Pre-rendered wrappers for block tags; the attribute-less form is by far
+# the most common in chat messages.
+_OPEN_TAGS = {name: f'<{name}>' for name in _BLOCK_TAGS}
+_CLOSE_TAGS = {name: f'</{name}>' for name in _BLOCK_TAGS}
+# Characters the parser would turn into markup or rewrite (entities, line
+# endings, NUL, byte order mark); without them the source is plain text.
+_NOT_PLAIN_TEXT = re.compile('[<&\r\x00\ufeff]')
+# lxml hands back text and attribute values with entities decoded; these
+# re-escape them in a single C-level pass each.
+_TEXT_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+_ATTR_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'})
 
 class HTMLFragmentationError(Exception):
     """Base exception for HTML fragmentation errors."""
@@ -11,94 +31,146 @@ class UnsplittableElementError(HTMLFragmentationError):
     """Raised when an unsplittable element exceeds max_len."""
     pass
 
+@lru_cache(maxsize=512)
+def _render_open_tag(name: str, attrs: Tuple[Tuple[str, str], ...]) -> str:
+    """Renders an opening tag; messages reuse a handful of tag/attr combinations."""
+    rendered = ' '.join(f'{k}="{v.translate(_ATTR_ESCAPES)}"' for k, v in attrs)
+    return f'<{name}{" " + rendered if rendered else ""}>'
+
 def split_message(source: str, max_len: int = MAX_LEN) -> Generator[str, None, None]:
-    """Splits HTML message into fragments while preserving tag structure."""
-    if not source.strip():
+    """Splits HTML message into fragments while preserving tag structure.
+
+    The source is fed to lxml's HTMLPullParser in chunks, so fragments are
+    yielded as soon as the parser reaches them instead of after the whole
+    document has been turned into a tree.
+    """
+    # isspace() answers this without copying the source, unlike strip().
+    if not source or source.isspace():
         return
-        
-    soup = BeautifulSoup(source, 'html.parser')
-    
-    def is_unsplittable(tag: Tag) -> bool:
-        return tag.name in ['a', 'code', 'mention']
-    
-    def is_block_tag(tag: Tag) -> bool:
-        return tag.name in ['p', 'b', 'strong', 'i', 'ul', 'ol', 'div', 'span']
-    
-    def create_fragment(content: str, wrapper_tags: List[Tag] = None) -> str:
-        """Creates a fragment with proper wrapper tags."""
-        if not wrapper_tags:
-            return content.strip()
-            
-        result = content
-        for tag in wrapper_tags:
-            attrs = ' '.join(f'{k}="{v}"' for k, v in tag.attrs.items())
-            result = f'<{tag.name}{" " + attrs if attrs else ""}>{result}</{tag.name}>'
-        return result.strip()
-
-    def get_content_length(content: str, wrapper_tags: List[Tag] = None) -> int:
-        """Calculate total length including wrapper tags."""
-        return len(create_fragment(content, wrapper_tags))
-
-    def process_tag(tag: Tag, current_wrappers: List[Tag] = None) -> Generator[str, None, None]:
-        if current_wrappers is None:
-            current_wrappers = []
-            
-        # Handle unsplittable tags
-        if is_unsplittable(tag):
-            content = str(tag)
-            if len(content) > max_len:
-                raise UnsplittableElementError(f"Element {tag.name} exceeds max_len")
-            yield content
+
+    def split_text(text: Optional[str],
+                   frame: Tuple[str, str, int]) -> Generator[str, None, None]:
+        """Yields a text run wrapped in its block tags, cut to fit max_len."""
+        if not text:
+            return
+        text = text.strip()
+        if not text:
             return
 
-        # Update wrappers for block tags
-        if is_block_tag(tag):
-            current_wrappers = current_wrappers + [tag]
-
-        # Calculate wrapper overhead
-        wrapper_overhead = len(create_fragment('', current_wrappers))
-        available_len = max_len - wrapper_overhead
-
-        # Process tag contents
-        current_fragment = ''
-        
-        for child in tag.children:
-            if isinstance(child, NavigableString):
-                text = str(child).strip()
-                if not text:
-                    continue
-                    
-                potential_text = current_fragment + (' ' if current_fragment else '') + text
-                if len(potential_text) <= available_len:
-                    current_fragment = potential_text
-                else:
-                    if current_fragment:
-                        yield create_fragment(current_fragment, current_wrappers)
-                    current_fragment = text if len(text) <= available_len else text[:available_len]
-                    if len(text) > available_len:
-                        for i in range(available_len, len(text), available_len):
-                            yield create_fragment(text[i:i + available_len], current_wrappers)
-                        current_fragment = ''
+        wrapper_start, wrapper_end, available_len = frame
+        if available_len <= 0:
+            raise HTMLFragmentationError("Wrapper tags exceed max_len")
+
+        text = text.translate(_TEXT_ESCAPES)
+        start = 0
+        while start < len(text):
+            end = start + available_len
+            if end < len(text):
+                # Do not cut an entity reference in half.
+                amp = text.rfind('&', max(start, end - 4), end)
+                if amp != -1 and text.find(';', amp, end) == -1:
+                    if amp == start:
+                        raise HTMLFragmentationError("Entity reference exceeds max_len")
+                    end = amp
+            chunk = text[start:end]
+            start = end
+            if wrapper_start:
+                yield f'{wrapper_start}{chunk}{wrapper_end}'
             else:
-                # Process nested tag
-                if current_fragment:
-                    yield create_fragment(current_fragment, current_wrappers)
-                    current_fragment = ''
-                
-                for fragment in process_tag(child, current_wrappers):
-                    yield fragment
-
-        if current_fragment:
-            yield create_fragment(current_fragment, current_wrappers)
-
-    # Process each top-level element
-    for element in soup.children:
-        if isinstance(element, NavigableString):
-            text = str(element).strip()
-            if not text:
+                chunk = chunk.strip()
+                if chunk:
+                    yield chunk
+
+    def release(element: etree._Element) -> None:
+        """Drops an already emitted element and its preceding siblings."""
+        element.clear(keep_tail=True)
+        # A stray '<' after </html> makes libxml2 start a second, parentless
+        # <html> root; its earlier sibling cannot be deleted.
+        parent = element.getparent()
+        if parent is None:
+            return
+        while element.getprevious() is not None:
+            del parent[0]
+
+    def parse_events() -> Iterator[Tuple[str, etree._Element]]:
+        """Feeds the source to libxml2 chunk by chunk, yielding start/end events."""
+        # huge_tree lifts libxml2's depth and text-size limits, which would
+        # otherwise stop the parse midway and truncate the message.
+        parser = etree.HTMLPullParser(
+            events=('start', 'end'),
+            huge_tree=True,
+            recover=True,
+            encoding='utf-8',
+            remove_comments=True,
+            remove_pis=True,
+        )
+        data = source.encode('utf-8')
+        for i in range(0, len(data), _FEED_SIZE):
+            parser.feed(data[i:i + _FEED_SIZE])
+            yield from parser.read_events()
+        parser.close()
+        yield from parser.read_events()
+
+        # recover=True repairs tag soup; a fatal error means parsing stopped early.
+        fatals = parser.error_log.filter_from_fatals()
+        if fatals:
+            raise HTMLFragmentationError(f"Failed to parse HTML: {fatals[0].message}")
+
+    # Tag-free input needs no parsing at all.
+    if not _NOT_PLAIN_TEXT.search(source):
+        yield from split_text(source, ('', '', max_len))
+        return
+
+    # One entry per open element: the (start, end) wrapper strings its text
+    # is emitted with and the room left for text between them.
+    frames: List[Tuple[str, str, int]] = []
+    # Unsplittable subtree currently being buffered whole.
+    pending: Optional[etree._Element] = None
+
+    for event, element in parse_events():
+        if pending is not None:
+            if event == 'end' and element is pending:
+                pending = None
+                content = etree.tostring(element, encoding='unicode',
+                                         method='html', with_tail=False)
+                if len(content) > max_len:
+                    raise UnsplittableElementError(f"Element {element.tag} exceeds max_len")
+                yield content
+                release(element)
+            continue
+
+        if event == 'start':
+            # Flush the text that precedes this element inside its parent.
+            if frames:
+                previous = element.getprevious()
+                text = previous.tail if previous is not None else element.getparent().text
+                yield from split_text(text, frames[-1])
+
+            if element.tag in _UNSPLITTABLE_TAGS:
+                pending = element
                 continue
-                
-            yield text
-        elif isinstance(element, Tag):
-            for fragment in process_tag(element):
-                yield fragment
\ No newline at end of file
+
+            parent = frames[-1] if frames else ('', '', max_len)
+            if element.tag in _BLOCK_TAGS:
+                wrapper_start, wrapper_end, available_len = parent
+                if element.attrib:
+                    start_tag = _render_open_tag(element.tag, tuple(element.attrib.items()))
+                else:
+                    start_tag = _OPEN_TAGS[element.tag]
+                end_tag = _CLOSE_TAGS[element.tag]
+                frames.append((wrapper_start + start_tag, end_tag + wrapper_end,
+                               available_len - len(start_tag) - len(end_tag)))
+            else:
+                frames.append(parent)
+        else:
+            # Flush the text that follows the last child of this element.
+            frame = frames.pop()
+            last = element[-1] if len(element) else None
+            text = last.tail if last is not None else element.text
+            yield from split_text(text, frame)
+            release(element)
+
+    # Every element the parser opens is closed again unless it gave up midway,
+    # e.g. at libxml2's nesting limit, which it does without logging an error.
+    if frames or pending is not None:
+        raise HTMLFragmentationError("HTML parsing stopped before the end of the message")
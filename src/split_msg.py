@@ -13,16 +13,16 @@ def main(max_len: int, format: str, verbose: bool, input_file: str):
     input_path = Path(input_file)
     
     try:
-        with open(input_path, 'r', encoding='utf-8') as f:
-            source = f.read()
+        # Decode the whole file in one call; libxml2 normalizes line endings.
+        source = input_path.read_bytes().decode('utf-8')
     except UnicodeDecodeError:
         click.echo("Error: Input file must be UTF-8 encoded", err=True)
         raise click.Abort()
     
     try:
-        fragments = list(split_message(source, max_len))
-        
         if format == 'json':
+            # The fragment count leads the document, so JSON output needs them all.
+            fragments = list(split_message(source, max_len))
             result = {
                 'total_fragments': len(fragments),
                 'fragments': [
@@ -33,13 +33,14 @@ def main(max_len: int, format: str, verbose: bool, input_file: str):
                     } for i, f in enumerate(fragments, 1)
                 ]
             }
-            click.echo(json.dumps(result, indent=2))
+            click.echo(json.dumps(result, ensure_ascii=False, separators=(',', ':')))
         else:
-            for i, fragment in enumerate(fragments, 1):
+            # Print each fragment as soon as it is split off, one write apiece.
+            for i, fragment in enumerate(split_message(source, max_len), 1):
                 if verbose:
-                    click.echo(f"-- fragment #{i}: {len(fragment)} chars --")
-                click.echo(fragment)
-                click.echo()
+                    click.echo(f"-- fragment #{i}: {len(fragment)} chars --\n{fragment}\n")
+                else:
+                    click.echo(f"{fragment}\n")
                 
     except HTMLFragmentationError as e:
         click.echo(f"HTML Fragmentation Error: {str(e)}", err=True)
@@ -0,0 +1,20 @@
+import pytest
+from pathlib import Path
+from src.msg_split import split_message
+
+@pytest.fixture(scope='session')
+def source_html():
+    """Contents of tests/test_data/source.html, read once per session."""
+    return (Path(__file__).parent / 'test_data' / 'source.html').read_text(encoding='utf-8')
+
+@pytest.fixture(scope='session')
+def fragments_by_maxlen(source_html):
+    """Returns the fragments of source.html for a max_len, splitting each max_len once."""
+    cache = {}
+
+    def getter(max_len):
+        if max_len not in cache:
+            cache[max_len] = list(split_message(source_html, max_len=max_len))
+        return cache[max_len]
+
+    return getter
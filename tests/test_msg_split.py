@@ -7,8 +7,11 @@ def test_simple_split():
     <p>Second paragraph</p>
     """
     fragments = list(split_message(html, max_len=20))
-    assert len(fragments) == 2
+    # Each paragraph needs two fragments: "<p></p>" leaves 13 chars of text.
+    assert len(fragments) == 4
     assert all(len(f) <= 20 for f in fragments)
+    text = ''.join(f.replace('<p>', '').replace('</p>', '') for f in fragments)
+    assert text == 'First paragraphSecond paragraph'
 
 def test_nested_tags():
     html = """
@@ -26,12 +29,9 @@ def test_unsplittable():
     with pytest.raises(HTMLFragmentationError):
         list(split_message(html, max_len=20))
 
-def test_specific_max_len_boundaries():
-    with open('tests/test_data/source.html', 'r', encoding='utf-8') as f:
-        html = f.read()
-    
+def test_specific_max_len_boundaries(fragments_by_maxlen):
     # Test with max_len = 4396
-    fragments_4396 = list(split_message(html, max_len=4396))
+    fragments_4396 = fragments_by_maxlen(4396)
     # Check that we have at least two fragments
     assert len(fragments_4396) >= 2
     # Check that the first fragment contains complete content
@@ -40,7 +40,7 @@ def test_specific_max_len_boundaries():
     assert all('<strong>' not in f or '</strong>' in f for f in fragments_4396)
     
     # Test with max_len = 4296
-    fragments_4296 = list(split_message(html, max_len=4296))
+    fragments_4296 = fragments_by_maxlen(4296)
     # Check that we have at least two fragments
     assert len(fragments_4296) >= 2
     # Check that fragments maintain proper tag structure
@@ -64,6 +64,32 @@ def test_invalid_html():
     assert all('<div>' in f for f in fragments)
     assert all('</div>' in f for f in fragments)
 
+def test_stray_tag_after_closing_html():
+    """A stray '<' after </html> makes libxml2 open a second root element."""
+    assert list(split_message('<p>x</p></html><', max_len=50)) == ['<p>x</p>', '&lt;']
+    assert list(split_message('text</html>more<', max_len=50)) == ['text', 'more&lt;']
+    assert list(split_message('<p>a</p></body></html>\n<', max_len=50)) == ['<p>a</p>', '&lt;']
+
+def test_deep_nesting_not_truncated():
+    """Nesting past libxml2's default depth limit of 255 must not end the parse."""
+    html = '<p>intro</p>' + '<div>' * 260 + 'deep' + '</div>' * 260 + '<p>after</p>'
+    fragments = list(split_message(html, max_len=4096))
+    assert fragments == ['<p>intro</p>', '<div>' * 260 + 'deep' + '</div>' * 260, '<p>after</p>']
+
+def test_nesting_beyond_parser_limit_raises():
+    """libxml2 silently stops at about 2048 levels; that must not yield a partial message."""
+    html = '<p>intro</p>' + '<i>' * 3000 + 'deep' + '</i>' * 3000 + '<p>after</p>'
+    with pytest.raises(HTMLFragmentationError):
+        list(split_message(html, max_len=4096))
+
+def test_oversized_text_run_not_truncated():
+    """A text run over libxml2's default 10 MB limit must not end the parse."""
+    html = '<p>a</p><p>' + 'x' * 10_000_001 + '</p><p>after</p>'
+    fragments = list(split_message(html, max_len=4096))
+    assert fragments[0] == '<p>a</p>'
+    assert fragments[-1] == '<p>after</p>'
+    assert sum(len(f) - len('<p></p>') for f in fragments[1:-1]) == 10_000_001
+
 def test_empty_input():
     html = ""
     fragments = list(split_message(html, max_len=30))
@@ -99,12 +125,9 @@ def test_emoji_handling():
     assert len(fragments) == 1
     assert '🕒' in fragments[0]
 
-def test_boundary_4396():
+def test_boundary_4396(fragments_by_maxlen):
     """Test splitting behavior with max_len=4396."""
-    with open('tests/test_data/source.html', 'r', encoding='utf-8') as f:
-        html = f.read()
-    
-    fragments = list(split_message(html, max_len=4396))
+    fragments = fragments_by_maxlen(4396)
     
     # Verify we have at least 2 fragments
     assert len(fragments) >= 2
@@ -119,12 +142,9 @@ def test_boundary_4396():
         assert not fragment.startswith('>')
         assert not fragment.endswith('<')
 
-def test_boundary_4296():
+def test_boundary_4296(fragments_by_maxlen):
     """Test splitting behavior with max_len=4296."""
-    with open('tests/test_data/source.html', 'r', encoding='utf-8') as f:
-        html = f.read()
-    
-    fragments = list(split_message(html, max_len=4296))
+    fragments = fragments_by_maxlen(4296)
     
     # Verify we have at least 2 fragments
     assert len(fragments) >= 2
@@ -139,4 +159,64 @@ def test_boundary_4296():
         assert fragment.count('<div>') == fragment.count('</div>')
         
         # Verify content integrity
-        assert fragment.strip()  # No empty fragments
\ No newline at end of file
+        assert fragment.strip()  # No empty fragments
+
+def test_text_outside_known_tags_preserved():
+    """Text outside the block/unsplittable tag set must not be dropped."""
+    html = 'Intro <strong>bold</strong> middle <h1>heading</h1> tail'
+    fragments = list(split_message(html, max_len=100))
+    joined = ' '.join(fragments)
+    for word in ('Intro', 'bold', 'middle', 'heading', 'tail'):
+        assert word in joined
+
+def test_head_content_preserved():
+    """Text libxml2 moves into <head> is kept, wherever it appears."""
+    assert list(split_message('<title>Weekly report</title><p>x</p>', max_len=50)) == \
+        ['Weekly report', '<p>x</p>']
+    assert list(split_message('<p>a</p><title>T</title>', max_len=50)) == ['<p>a</p>', 'T']
+    assert list(split_message('<script>var x</script><p>y</p>', max_len=50)) == \
+        ['var x', '<p>y</p>']
+
+def test_wrappers_nested_in_document_order():
+    html = '<div><p>Text</p></div>'
+    fragments = list(split_message(html, max_len=50))
+    assert fragments == ['<div><p>Text</p></div>']
+
+def test_plain_text_split():
+    """Tag-free input is cut to max_len like any other text."""
+    fragments = list(split_message('x' * 50, max_len=20))
+    assert fragments == ['x' * 20, 'x' * 20, 'x' * 10]
+
+def test_top_level_text_respects_max_len():
+    html = '<b>Bold</b> ' + 'y' * 45
+    fragments = list(split_message(html, max_len=20))
+    assert fragments[0] == '<b>Bold</b>'
+    assert all(len(f) <= 20 for f in fragments)
+    assert ''.join(fragments[1:]) == 'y' * 45
+
+def test_entities_stay_escaped():
+    html = '<p title="say &quot;hi&quot;">use &lt;b&gt; &amp; more</p>'
+    fragments = list(split_message(html, max_len=100))
+    assert fragments == ['<p title="say &quot;hi&quot;">use &lt;b&gt; &amp; more</p>']
+
+def test_entity_not_cut_in_half():
+    html = '<p>' + '&amp;' * 10 + '</p>'
+    fragments = list(split_message(html, max_len=19))
+    assert all(len(f) <= 19 for f in fragments)
+    assert all(f == '<p>&amp;&amp;</p>' for f in fragments)
+    assert len(fragments) == 5
+
+def test_entity_cut_moves_back_to_ampersand():
+    """A cut landing inside '&amp;' moves back so the entity starts the next fragment."""
+    # "<p></p>" leaves 5 chars: the first cut would fall inside "&amp;".
+    fragments = list(split_message('<p>a&amp;b</p>', max_len=12))
+    assert fragments == ['<p>a</p>', '<p>&amp;</p>', '<p>b</p>']
+
+def test_entity_larger_than_fragment_raises():
+    # "<p></p>" leaves 3 chars, too few for "&amp;".
+    with pytest.raises(HTMLFragmentationError, match="Entity reference exceeds max_len"):
+        list(split_message('<p>&amp;&amp;</p>', max_len=10))
+
+def test_wrapper_tags_exceeding_max_len_raise():
+    with pytest.raises(HTMLFragmentationError, match="Wrapper tags exceed max_len"):
+        list(split_message('<div><p>x</p></div>', max_len=10))
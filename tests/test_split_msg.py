@@ -2,6 +2,7 @@ import pytest
 from click.testing import CliRunner
 from src.split_msg import main
 from pathlib import Path
+import json
 
 @pytest.fixture
 def runner():
@@ -52,4 +53,15 @@ def test_cli_non_utf8_file(runner, tmp_path):
     
     result = runner.invoke(main, [str(file_path)])
     assert result.exit_code != 0
-    assert "Error: Input file must be UTF-8 encoded" in result.output 
\ No newline at end of file
+    assert "Error: Input file must be UTF-8 encoded" in result.output 
+
+def test_cli_json_compact_unicode(runner, tmp_path):
+    file_path = tmp_path / "emoji.html"
+    file_path.write_text("<p>🕒 Done</p>", encoding='utf-8')
+
+    result = runner.invoke(main, ['--format', 'json', str(file_path)])
+    assert result.exit_code == 0
+    data = json.loads(result.output)
+    assert data['total_fragments'] == 1
+    assert data['fragments'][0]['content'] == "<p>🕒 Done</p>"
+    assert "🕒" in result.output  # not escaped as \ud83d\udd52